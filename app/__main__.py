@@ -1,5 +1,15 @@
 # app/__main__.py
+import asyncio
+
 from .commands import app
 
+# uvloop is an optional, faster drop-in event loop; asyncio's default is used without it.
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 if __name__ == "__main__":
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     app()
\ No newline at end of file
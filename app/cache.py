@@ -0,0 +1,51 @@
+# app/cache.py
+import hashlib
+from typing import Optional
+
+from app import config
+
+# A single client is created lazily and reused for the lifetime of the process.
+_client = None
+
+def get_client():
+    """Returns the shared synchronous Redis client for the FalkorDB instance."""
+    global _client
+    if _client is None:
+        import redis
+        _client = redis.Redis(host=config.FALKORDB_HOST, port=config.FALKORDB_PORT, decode_responses=True)
+    return _client
+
+def answer_key(question: str, model: str) -> str:
+    """
+    Builds a content-addressed cache key for a question.
+    Whitespace and case are normalised so trivially different phrasings share an entry.
+    """
+    normalised = " ".join(question.split()).lower()
+    digest = hashlib.sha256(f"{config.GRAPH_NAME}|{model}|{normalised}".encode("utf-8")).hexdigest()
+    return config.ASK_CACHE_PREFIX + digest
+
+def get_answer(question: str, model: str) -> Optional[str]:
+    """Returns the cached answer for a question, or None on a miss."""
+    # The cache is best-effort: an unreachable Redis must never break `ask`.
+    try:
+        return get_client().get(answer_key(question, model))
+    except Exception:
+        return None
+
+def set_answer(question: str, model: str, answer: str) -> None:
+    """Stores an answer with the configured TTL."""
+    try:
+        get_client().setex(answer_key(question, model), config.ASK_CACHE_TTL, answer)
+    except Exception:
+        pass
+
+def clear_answers() -> int:
+    """Deletes every cached answer, returning how many entries were removed."""
+    try:
+        r = get_client()
+        keys = list(r.scan_iter(match=f"{config.ASK_CACHE_PREFIX}*", count=500))
+        if keys:
+            r.delete(*keys)
+        return len(keys)
+    except Exception:
+        return 0
@@ -1,47 +1,93 @@
 # app/cli_commands/ask.py
 import typer
 import os
-import json
-import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List
 
-from graphrag_sdk import KnowledgeGraph, Ontology
-from graphrag_sdk.models.litellm import LiteModel
+from graphrag_sdk import GenerativeModelConfig, KnowledgeGraph, Ontology
 from graphrag_sdk.model_config import KnowledgeGraphModelConfig
 
-from app import config
+from app import cache, config, utils
+
+@lru_cache(maxsize=4)
+def _get_kg(model: str, ontology: Ontology) -> KnowledgeGraph:
+    """
+    Builds the model and graph client for `model`, reusing them across calls in this process.
+    `ontology` comes from `utils.load_ontology`, which returns the same object until the
+    file changes, so a rebuilt ontology gets a fresh client.
+    """
+    # Imported here: litellm takes seconds to import, and only LLM-backed commands need it.
+    from graphrag_sdk.models.litellm import LiteModel
+
+    # Deterministic sampling: the same question yields the same Cypher and answer,
+    # which keeps the answer cache meaningful.
+    llm = LiteModel(
+        model_name=model,
+        generation_config=GenerativeModelConfig(temperature=config.ASK_TEMPERATURE, seed=config.ASK_SEED),
+    )
+    return KnowledgeGraph(
+        name=config.GRAPH_NAME,
+        model_config=KnowledgeGraphModelConfig.with_model(llm),
+        ontology=ontology,
+        host=config.FALKORDB_HOST,
+        port=config.FALKORDB_PORT,
+    )
 
 def ask(
-    question: str = typer.Argument(..., help="Your natural-language question."),
+    questions: List[str] = typer.Argument(..., help="One or more natural-language questions."),
     model: str = typer.Option(
         config.DEFAULT_MODEL_NAME,
         "--model",
         "-m",
         help="The model to use for answering, e.g., 'openai/gpt-4.1' or 'ollama/llama3'."
-    )
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Bypass the cached answer and query the graph again.")
 ):
-    """Ask a question against the knowledge graph."""
-    typer.echo(f"❓ Asking: '{question}'")
+    """Ask one or more questions against the knowledge graph."""
+    # Repeated questions are only answered once.
+    questions = list(dict.fromkeys(questions))
+    for question in questions:
+        typer.echo(f"❓ Asking: '{question}'")
     try:
         if not os.path.exists(config.ONTOLOGY_FILE):
             typer.secho(f"Error: Ontology file '{config.ONTOLOGY_FILE}' not found.", fg=typer.colors.RED)
             raise typer.Exit()
 
-        with open(config.ONTOLOGY_FILE, "r", encoding="utf-8") as file:
-            ontology = Ontology.from_json(json.load(file))
-        
-        typer.echo(f"--- Using model: {model} ---")
-        llm = LiteModel(model_name=model)
-        kg = KnowledgeGraph(
-            name=config.GRAPH_NAME,
-            model_config=KnowledgeGraphModelConfig.with_model(llm),
-            ontology=ontology,
-            host=config.FALKORDB_HOST,
-            port=config.FALKORDB_PORT,
-        )
-        typer.echo("  - Starting chat session…")
-        response = kg.chat_session().send_message(question)
-        typer.secho("✅ Answer:", fg=typer.colors.GREEN)
-        typer.echo(response['response'])
+        answers, cached, errors = {}, set(), {}
+        if not no_cache:
+            for question in questions:
+                hit = cache.get_answer(question, model)
+                if hit is not None:
+                    answers[question] = hit
+                    cached.add(question)
+        pending = [q for q in questions if q not in answers]
+
+        if pending:
+            typer.echo(f"--- Using model: {model} ---")
+            kg = _get_kg(model, utils.load_ontology())
+            typer.echo("  - Starting chat session…")
+            # The model and graph client are shared; each question gets its own
+            # session so the LLM round-trips can overlap instead of running serially.
+            with ThreadPoolExecutor(max_workers=min(config.ASK_MAX_WORKERS, len(pending))) as executor:
+                futures = {q: executor.submit(lambda q=q: kg.chat_session().send_message(q)) for q in pending}
+            # A failed question is reported on its own; the other answers are still cached and shown.
+            for question, future in futures.items():
+                try:
+                    answers[question] = future.result()['response']
+                except Exception as e:
+                    errors[question] = e
+                    continue
+                cache.set_answer(question, model, answers[question])
+
+        for question in questions:
+            if len(questions) > 1:
+                typer.echo(f"\n❓ {question}")
+            if question in errors:
+                typer.secho(f"🔥 Failed to answer: {errors[question]}", fg=typer.colors.RED)
+                continue
+            typer.secho("✅ Answer (cached):" if question in cached else "✅ Answer:", fg=typer.colors.GREEN)
+            typer.echo(answers[question])
     except Exception as e:
         typer.secho(f"🔥 A critical error occurred: {e}", fg=typer.colors.RED)
-        traceback.print_exception(e)
+        utils.print_traceback(e)
@@ -1,16 +1,92 @@
 
 # app/cli_commands/build.py
 import typer
+import asyncio
+import hashlib
 import json
-import traceback
 import os
+from typing import TYPE_CHECKING, List, Optional
 
-from graphrag_sdk import KnowledgeGraph, Ontology
-from graphrag_sdk.models.litellm import LiteModel
+from graphrag_sdk import Ontology
 from graphrag_sdk.model_config import KnowledgeGraphModelConfig
+from redis.exceptions import ResponseError
 
-from app import config, utils
-from app.loaders import UnstructuredPDFLoader
+from app import cache, config, utils
+from app.ingest import BatchedKnowledgeGraph
+from app.loaders import UnstructuredPDFLoader, iter_pdf_texts, list_pdfs
+
+if TYPE_CHECKING:
+    from graphrag_sdk.models.litellm import LiteModel
+
+async def _discover_ontology(sources: List, model: "LiteModel", use_cache: bool = True) -> Optional[Ontology]:
+    """
+    Discovers the ontology of all `sources` with a single SDK call.
+    `Ontology.from_sources` already extracts the sources in parallel worker threads
+    and finishes with one fix pass over the merged result, so the call is made once
+    for the whole set rather than per PDF. It is retried on failure, and the result
+    is cached on disk keyed by the model name and every document's text.
+    Returns None if no ontology could be discovered.
+    """
+    srcs = sorted(sources, key=lambda src: src.source_id)
+    if not srcs:
+        return None
+
+    digest = hashlib.sha256(str(model.model).encode("utf-8"))
+    for src in srcs:
+        digest.update(b"\0" + next(iter(src.load())).content.encode("utf-8"))
+    cache_path = config.ONTOLOGY_DISCOVERY_CACHE_DIR / f"{digest.hexdigest()}.json"
+    if use_cache and cache_path.exists():
+        return Ontology.from_json(utils.read_json(cache_path))
+
+    try:
+        ontology = await utils.to_thread_with_retry(
+            Ontology.from_sources, srcs, model=model, hide_progress=True,
+            attempts=config.LLM_RETRIES + 1, base_delay=config.LLM_RETRY_BASE_DELAY,
+        )
+    except Exception as e:
+        typer.secho(f"  ⚠️  Ontology discovery failed: {e}", fg=typer.colors.YELLOW)
+        return None
+
+    config.ONTOLOGY_DISCOVERY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    utils.write_json(tmp_path, ontology.to_json())
+    os.replace(tmp_path, cache_path)
+    return ontology
+
+def _load_manifest() -> dict:
+    """Returns the ingest manifest (PDF path -> digest of the text last written to the graph)."""
+    try:
+        return utils.read_json(config.INGEST_MANIFEST)
+    except (OSError, ValueError):
+        return {}
+
+def _graph_is_empty(kg: BatchedKnowledgeGraph) -> bool:
+    """True if the graph has no nodes, e.g. because it was dropped after the last build."""
+    try:
+        return not kg.graph.ro_query("MATCH (n) RETURN 1 LIMIT 1").result_set
+    except ResponseError:
+        # Reading a graph key that does not exist is an error rather than an empty result.
+        return True
+
+def _ingest(kg: BatchedKnowledgeGraph, sources: list, manifest: dict, digests: dict) -> None:
+    """
+    Extracts `sources` into the graph in chunks and records every document that
+    succeeded in the manifest. Chunking bounds how many documents the extraction
+    step holds at once, and saving after each chunk means an interrupted build
+    resumes from the last finished chunk.
+    """
+    size = config.INGEST_CHUNK_SIZE
+    chunks = -(-len(sources) // size)
+    config.INGEST_MANIFEST.parent.mkdir(parents=True, exist_ok=True)
+    for i in range(0, len(sources), size):
+        chunk = sources[i:i + size]
+        kg.process_sources(chunk)
+        failed = set(kg.failed_documents or [])
+        manifest.update((src.source_id, digests[src.source_id]) for src in chunk if src.source_id not in failed)
+        utils.write_json(config.INGEST_MANIFEST, manifest)
+        kg.save_canonical_names()
+        if chunks > 1:
+            typer.echo(f"  chunk {i // size + 1}/{chunks} done")
 
 def build(
     model: str = typer.Option(
@@ -18,44 +94,69 @@ def build(
         "--model",
         "-m",
         help="The model to use for processing, e.g., 'openai/gpt-4.1' or 'gemini/gemini-pro'."
-    )
+    ),
+    full_reingest: bool = typer.Option(
+        False,
+        "--full-reingest",
+        help="Ignore the ingest manifest and re-process every PDF, even unchanged ones."
+    ),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Ignore the cached ontology of the initial PDFs and discover it again."),
 ):
     """Build and evolve the knowledge graph from all PDF files."""
     typer.echo("🚀 Starting the knowledge-graph build process…")
     try:
-        # --- MODIFIED: Use the new duck-typed loader class ---
-        initial_sources = [
-            UnstructuredPDFLoader(path=os.path.join(config.INITIAL_PDF_DIR, f))
-            for f in os.listdir(config.INITIAL_PDF_DIR)
-            if f.endswith(".pdf")
-        ]
+        initial_paths = list_pdfs(config.INITIAL_PDF_DIR)
 
-        if not initial_sources:
+        if not initial_paths:
             typer.secho(f"No PDFs found in '{config.INITIAL_PDF_DIR}'. Aborting.", fg=typer.colors.RED)
             raise typer.Exit()
 
+        additional_paths = list_pdfs(config.ADDITIONAL_PDF_DIR)
+
         typer.echo(f"\n--- Using model: {model} ---")
+        # Imported here: litellm takes seconds to import, and only LLM-backed commands need it.
+        from graphrag_sdk.models.litellm import LiteModel
         llm = LiteModel(model_name=model)
-        
+
+        # Parse every PDF once, in parallel, so the ontology and ingestion passes
+        # below reuse the extracted text instead of re-partitioning each file.
         typer.echo("\n--- Creating Ontology ---")
-        typer.echo("🔍 Discovering ontology from documents…")
+        typer.echo(f"📑 Parsing {len(initial_paths) + len(additional_paths)} PDFs…")
+
+        async def _parse_all() -> dict:
+            return {path: text async for path, text in iter_pdf_texts(initial_paths + additional_paths)}
+
+        texts = asyncio.run(_parse_all())
+
+        # --- MODIFIED: Use the new duck-typed loader class ---
+        initial_sources = [UnstructuredPDFLoader(path=p, text=texts[p]) for p in initial_paths if p in texts]
+        additional_sources = [UnstructuredPDFLoader(path=p, text=texts[p]) for p in additional_paths if p in texts]
+
+        if not initial_sources:
+            typer.secho(f"None of the PDFs in '{config.INITIAL_PDF_DIR}' could be parsed. Aborting.", fg=typer.colors.RED)
+            raise typer.Exit()
+
+        typer.echo("🔎 Discovering the ontology…")
         # The SDK's from_sources method will work with our duck-typed loader
-        discovered = Ontology.from_sources(initial_sources, model=llm)
+        discovered = asyncio.run(_discover_ontology(initial_sources, llm, use_cache=not no_cache))
+        if discovered is None:
+            raise RuntimeError("Ontology discovery failed for the initial PDFs.")
 
         if config.ONTO_PATH.exists():
             typer.echo("📄  Merging with existing ontology.json")
-            raw_json = json.loads(config.ONTO_PATH.read_text())
+            raw_json = utils.read_json(config.ONTO_PATH)
             existing = Ontology.from_json(utils.normalise_schema(raw_json))
             ontology = utils.merge_ontologies(existing, discovered)
         else:
             typer.echo("📄  No existing ontology.json, using discovered one")
             ontology = discovered
 
-        config.ONTO_PATH.write_text(json.dumps(ontology.to_json(), indent=2))
+        ontology_json = ontology.to_json()
+        utils.write_json(config.ONTO_PATH, ontology_json)
         typer.secho("✓  ontology.json updated", fg=typer.colors.GREEN)
 
         typer.echo("\n--- Creating and Evolving Knowledge Graph ---")
-        kg = KnowledgeGraph(
+        kg = BatchedKnowledgeGraph(
             name=config.GRAPH_NAME,
             model_config=KnowledgeGraphModelConfig.with_model(llm),
             ontology=ontology,
@@ -63,24 +164,53 @@ def build(
             port=config.FALKORDB_PORT,
         )
 
-        typer.echo(f"\nIngesting {len(initial_sources)} initial documents…")
-        # The SDK's process_sources method will also work
-        kg.process_sources(initial_sources)
-        typer.secho("✅ Initial ingestion complete.", fg=typer.colors.GREEN)
-
-        additional_sources = [
-            UnstructuredPDFLoader(path=os.path.join(config.ADDITIONAL_PDF_DIR, f))
-            for f in os.listdir(config.ADDITIONAL_PDF_DIR)
-            if f.endswith(".pdf")
-        ]
-        all_sources = initial_sources + additional_sources
-
-        typer.echo(f"\nEvolving graph with all {len(all_sources)} documents…")
-        kg.process_sources(all_sources)
-        typer.secho("✅ Graph evolution complete.", fg=typer.colors.GREEN)
+        # PDFs whose text was already written to this graph, with the same ontology and
+        # model, by an earlier build are skipped. The manifest is ignored if the graph
+        # has since been dropped.
+        # The name mapping records spellings already in the graph, so it goes with the manifest.
+        if full_reingest or _graph_is_empty(kg):
+            manifest = {}
+            kg.canonical_names.clear()
+        else:
+            manifest = _load_manifest()
+        ontology_digest = hashlib.sha256(json.dumps(ontology_json, sort_keys=True).encode("utf-8")).hexdigest()
+        digests = {
+            p: hashlib.sha256(f"{config.GRAPH_NAME}|{model}|{ontology_digest}|{t}".encode("utf-8")).hexdigest()
+            for p, t in texts.items()
+        }
+
+        def _pending(sources: list) -> list:
+            return [src for src in sources if manifest.get(src.source_id) != digests[src.source_id]]
+
+        pending_initial = _pending(initial_sources)
+        if pending_initial:
+            typer.echo(f"\nIngesting {len(pending_initial)} initial documents…")
+            # The SDK's process_sources method will also work
+            _ingest(kg, pending_initial, manifest, digests)
+            typer.secho("✅ Initial ingestion complete.", fg=typer.colors.GREEN)
+        else:
+            typer.echo("\nInitial documents are unchanged since the last build; skipping ingestion.")
+
+        # The initial documents were written above, so only the additional ones are extracted here.
+        evolve_sources = _pending(additional_sources)
+
+        if evolve_sources:
+            typer.echo(f"\nEvolving graph with {len(evolve_sources)} documents…")
+            _ingest(kg, evolve_sources, manifest, digests)
+            typer.secho("✅ Graph evolution complete.", fg=typer.colors.GREEN)
+        elif additional_sources:
+            typer.echo("\nAdditional documents are unchanged since the last build; skipping graph evolution.")
+        else:
+            typer.echo(f"\nNo additional PDFs in '{config.ADDITIONAL_PDF_DIR}'; skipping graph evolution.")
+
+        # Answers computed against the previous graph are now stale.
+        cleared = cache.clear_answers()
+        if cleared:
+            typer.echo(f"🧹 Cleared {cleared} cached answers.")
+
         typer.secho("\n🎉 Knowledge-graph build finished successfully!", fg=typer.colors.BRIGHT_GREEN)
 
     except Exception as e:
         typer.secho(f"🔥 A critical error occurred: {e}", fg=typer.colors.RED)
-        traceback.print_exception(e)
+        utils.print_traceback(e)
 
@@ -1,10 +1,9 @@
 # app/cli_commands/relations.py
 import typer
+import asyncio
 import os
-import json
-import traceback
 
-from app import config, utils
+from app import config, redis_client, utils
 
 def relations(counts: bool = typer.Option(False, "--counts", "-c", help="Show live edge-counts per relation")):
     """List all relation types defined in the ontology."""
@@ -13,7 +12,7 @@ def relations(counts: bool = typer.Option(False, "--counts", "-c", help="Show li
             typer.secho("Run `python -m app build` first – no ontology found.", fg=typer.colors.RED)
             raise typer.Exit()
 
-        onto_json = json.loads(config.ONTO_PATH.read_text())
+        onto_json = utils.read_json(config.ONTO_PATH)
         rel_labels = [rel["label"] for rel in onto_json.get("relations", [])]
 
         if not rel_labels:
@@ -22,25 +21,10 @@ def relations(counts: bool = typer.Option(False, "--counts", "-c", help="Show li
 
         counts_map = {}
         if counts:
-            try:
-                import redis.asyncio as redis
-                import asyncio
-            except ImportError:
-                typer.secho("Install redis-py to use --counts.", fg=typer.colors.YELLOW)
-                raise typer.Exit()
-
             async def _get_counts() -> dict[str, int]:
-                r = redis.Redis(host=config.FALKORDB_HOST, port=config.FALKORDB_PORT, decode_responses=True)
-                out = {}
-                for lbl in rel_labels:
-                    q = f"MATCH ()-[:`{lbl}`]->() RETURN count(*)"
-                    res = await r.execute_command("GRAPH.QUERY", config.GRAPH_NAME, q, "--compact")
-                    val = res[1]
-                    while isinstance(val, list):
-                        val = val[0]
-                    out[lbl] = int(val)
-                await r.aclose()
-                return out
+                async with redis_client.connect() as r:
+                    _, edge_ct = await redis_client.count_by_label(r, edge_labels=rel_labels)
+                return edge_ct
             
             counts_map = asyncio.run(_get_counts())
 
@@ -49,4 +33,4 @@ def relations(counts: bool = typer.Option(False, "--counts", "-c", help="Show li
 
     except Exception as exc:
         typer.secho(f"🔥  Error: {exc}", fg=typer.colors.RED)
-        traceback.print_exception(exc)
\ No newline at end of file
+        utils.print_traceback(exc)
\ No newline at end of file
@@ -1,12 +1,10 @@
 # app/cli_commands/schema.py
 import typer
+import asyncio
 import os
-import json
-import traceback
 from typing import Tuple
 
-from graphrag_sdk import Ontology
-from app import config, utils
+from app import config, redis_client, utils
 
 def schema(counts: bool = typer.Option(False, "--counts", "-c", help="Show live counts.")):
     """Show the ontology (labels, attributes, relations)."""
@@ -15,55 +13,27 @@ def schema(counts: bool = typer.Option(False, "--counts", "-c", help="Show live
             typer.secho(f"Ontology file '{config.ONTOLOGY_FILE}' not found.", fg=typer.colors.RED)
             raise typer.Exit()
 
-        with open(config.ONTOLOGY_FILE, "r", encoding="utf-8") as fh:
-            ontology = Ontology.from_json(json.load(fh))
+        ontology = utils.load_ontology()
 
-        schema_dict = ontology.to_json()
-        ent_dicts   = schema_dict.get("entities", [])
-        rel_dicts   = schema_dict.get("relations", [])
-
-        node_rows = [(ent["label"], ", ".join(attr["name"] for attr in ent.get("attributes", [])) or "—") for ent in ent_dicts]
+        # Rows are read straight off the ontology objects; serialising it to JSON first
+        # would copy every entity and relation just to read a few fields back.
+        node_rows = [(ent.label, ", ".join(attr.name for attr in ent.attributes) or "—") for ent in ontology.entities]
         utils.print_table(node_rows, "📦  ENTITY LABELS")
 
-        rel_rows = [(rel["label"], f'{rel["source"]["label"]} → {rel["target"]["label"]}') for rel in rel_dicts]
+        rel_rows = [(rel.label, f"{rel.source.label} → {rel.target.label}") for rel in ontology.relations]
         utils.print_table(rel_rows, "🔗  RELATIONS")
 
         if counts:
-            try:
-                import redis.asyncio as redis
-                import asyncio
-            except ImportError:
-                typer.secho("⚠️  Install redis-py (pip install redis) to use --counts.", fg=typer.colors.YELLOW)
-                raise typer.Exit()
-            
             async def _count_labels() -> Tuple[dict, dict]:
-                r = redis.Redis(host=config.FALKORDB_HOST, port=config.FALKORDB_PORT, decode_responses=True)
-                node_ct, edge_ct = {}, {}
-                
-                # --- FIXED: Correctly parse nested list response ---
-                for lbl, _ in node_rows:
-                    q = f"MATCH (n:{lbl}) RETURN count(n)"
-                    res = await r.execute_command("GRAPH.QUERY", config.GRAPH_NAME, q, "--compact")
-                    val = res[1]
-                    while isinstance(val, list):
-                        val = val[0]
-                    node_ct[lbl] = int(val)
-
-                for lbl, _ in rel_rows:
-                    q = f"MATCH ()-[:{lbl}]->() RETURN count(*)"
-                    res = await r.execute_command("GRAPH.QUERY", config.GRAPH_NAME, q, "--compact")
-                    val = res[1]
-                    while isinstance(val, list):
-                        val = val[0]
-                    edge_ct[lbl] = int(val)
-                
-                await r.close()
-                return node_ct, edge_ct
+                async with redis_client.connect() as r:
+                    return await redis_client.count_by_label(
+                        r, [lbl for lbl, _ in node_rows], [lbl for lbl, _ in rel_rows]
+                    )
 
             node_counts, edge_counts = asyncio.run(_count_labels())
-            utils.print_table([(k, str(v)) for k, v in node_counts.items()], "📊  NODE COUNTS")
-            utils.print_table([(k, str(v)) for k, v in edge_counts.items()], "📊  EDGE COUNTS")
+            utils.print_table(list(node_counts.items()), "📊  NODE COUNTS")
+            utils.print_table(list(edge_counts.items()), "📊  EDGE COUNTS")
 
     except Exception as e:
         typer.secho(f"🔥 A critical error occurred: {e}", fg=typer.colors.RED)
-        traceback.print_exception(e)
+        utils.print_traceback(e)
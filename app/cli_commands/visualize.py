@@ -1,15 +1,9 @@
 # app/cli_commands/visualize.py
 import typer
-import random
-import traceback
-from typing import List, Dict, Any
+import asyncio
+from typing import Dict
 
-try:
-    from pyvis.network import Network
-except ImportError:
-    Network = None
-
-from app import config
+from app import redis_client, utils
 
 
 def visualize(
@@ -23,97 +17,84 @@ def visualize(
     """Generate an interactive PyVis HTML visualisation of the current graph."""
     typer.echo("Generating interactive graph visualization...")
     try:
-        if Network is None:
-            typer.secho("❌ Install pyvis (`pip install pyvis`) to use this command.", fg=typer.colors.RED)
-            raise typer.Exit()
-
+        # pyvis is only needed here, so other commands do not pay for importing it.
         try:
-            import redis.asyncio as redis
-            import asyncio
+            from pyvis.network import Network
         except ImportError:
-            typer.secho("❌ Install redis-py (`pip install redis`) to use this command.", fg=typer.colors.RED)
+            typer.secho("❌ Install pyvis (`pip install pyvis`) to use this command.", fg=typer.colors.RED)
             raise typer.Exit()
 
-        def _parse_compact_response(raw_response: list) -> list:
-            """
-            Parses the complex, nested list structure from a --compact FalkorDB query.
-            The expected format is [ header, [data_rows], metadata ].
+        net = Network(height="800px", width="100%", bgcolor="#222222", font_color="white", directed=True, notebook=False)
+        
+        PREDEFINED_COLORS = ["#5E81AC", "#81A1C1", "#88C0D0", "#8FBCBB", "#A3BE8C", "#B48EAD", "#BF616A", "#D08770", "#EBCB8B", "#D8DEE9"]
+        DEFAULT_COLOR = "#4C566A"
+        # Long titles are cut short on the canvas; the hover tooltip shows them in full.
+        LABEL_MAX_CHARS = 120
+
+        # Node size is computed server-side, so rows arrive ready to use.
+        # The limit is applied before the degree is counted, so only returned nodes pay for it,
+        # and each node's degree is counted once and reused for its size.
+        nodes_query = """
+        MATCH (n)
+        WITH n LIMIT $limit
+        WITH n, size((n)--()) AS degree
+            RETURN id(n) AS node_id,
+            head(labels(n)) AS label,
+            toString(coalesce(n.title, n.name, id(n))) AS display_text,
+            degree,
+            10 + degree * 2 AS size
+        """
+
+        labels_query = "CALL db.labels() YIELD label RETURN label"
+
+        # Only edges between the nodes already drawn are fetched, so the server does
+        # the filtering and every returned edge is one the network can use.
+        edges_query = """
+        MATCH (a)-[r]->(b)
+        WHERE id(a) IN $ids AND id(b) IN $ids
+        RETURN id(a) AS from_id, id(b) AS to_id, type(r) AS rel_type
+        LIMIT $limit
+        """
+
+        async def _populate_network(lim: int) -> int:
             """
-            if not raw_response or len(raw_response) < 2:
-                return []
-            
-            header = [h[1] for h in raw_response[0]]
-            data_section = raw_response[1]
-
-            if not isinstance(data_section, list):
-                return []
-
-            data_rows = []
-            for nested_row in data_section:
-                if not isinstance(nested_row, list):
-                    continue
-                
-                flat_row = [item[1] if isinstance(item, list) and len(item) > 1 else item for item in nested_row]
-                
-                if len(flat_row) == len(header):
-                    data_rows.append(flat_row)
-            return data_rows
+            Fetches up to `lim` nodes, then up to `lim` edges between them, into the PyVis
+            network, one query each. Returns the node count.
 
-        async def _fetch_graph_data(lim: int) -> tuple[list, list]:
-            """Fetches all nodes and edges from the graph separately."""
-            r = redis.Redis(host=config.FALKORDB_HOST, port=config.FALKORDB_PORT, decode_responses=True)
-            
-            nodes_query = f"""
-            MATCH (n)
-                RETURN id(n) AS node_id,
-                head(labels(n)) AS label,
-                coalesce(n.title, n.name, id(n)) AS display_text,
-                size((n)--()) AS degree
-            LIMIT {lim}
+            Rows are appended as vis-network dicts straight onto the network's lists.
+            `add_node`/`add_edge` check membership against a plain list on every call,
+            which is quadratic in the graph size; here node ids are unique by query and
+            edges are already restricted to drawn nodes, so those checks are redundant.
             """
-            nodes_raw = await r.execute_command("GRAPH.QUERY", config.GRAPH_NAME, nodes_query, "--compact")
-            
-            edges_query = f"""
-            MATCH (a)-[r]->(b)
-            RETURN id(a) AS from_id, id(b) AS to_id, type(r) AS rel_type
-            LIMIT {lim}
-            """
-            edges_raw = await r.execute_command("GRAPH.QUERY", config.GRAPH_NAME, edges_query, "--compact")
-
-            await r.aclose()
-            
-            return _parse_compact_response(nodes_raw), _parse_compact_response(edges_raw)
-
-        nodes, edges = asyncio.run(_fetch_graph_data(limit))
-
-        if not nodes:
+            async with redis_client.connect() as r:
+                # Assign every label its colour up front, so the node loop is a plain lookup.
+                labels = sorted(row[0] for row in redis_client.compact_rows(await redis_client.graph_query(r, labels_query)))
+                colour_map: Dict[str, str] = {lbl: PREDEFINED_COLORS[i % len(PREDEFINED_COLORS)] for i, lbl in enumerate(labels)}
+
+                rows = redis_client.compact_rows(await redis_client.graph_query(r, nodes_query, {"limit": lim}))
+                nodes = [
+                    {"id": node_id, "label": display_text[:LABEL_MAX_CHARS], "title": f"{display_text}\nLabel: {label}\nDegree: {degree}",
+                     "color": colour_map.get(label, DEFAULT_COLOR), "shape": "dot", "size": size, "font": {"color": net.font_color}}
+                    for node_id, label, display_text, degree, size in rows
+                ]
+                net.nodes.extend(nodes)
+                net.node_map.update((node["id"], node) for node in nodes)
+                node_ids = [node["id"] for node in nodes]
+
+                if node_ids:
+                    net.node_ids.extend(node_ids)
+                    rows = redis_client.compact_rows(await redis_client.graph_query(r, edges_query, {"ids": node_ids, "limit": lim}))
+                    net.edges.extend(
+                        {"label": str(rel_type), "arrows": "to", "from": from_id, "to": to_id}
+                        for from_id, to_id, rel_type in rows
+                    )
+
+            return len(node_ids)
+
+        if not asyncio.run(_populate_network(limit)):
             typer.secho("Graph appears empty—nothing to visualise.", fg=typer.colors.YELLOW)
             return
 
-        net = Network(height="800px", width="100%", bgcolor="#222222", font_color="white", directed=True, notebook=False)
-        
-        PREDEFINED_COLORS = ["#5E81AC", "#81A1C1", "#88C0D0", "#8FBCBB", "#A3BE8C", "#B48EAD", "#BF616A", "#D08770", "#EBCB8B", "#D8DEE9"]
-        colour_map: Dict[str, str] = {}
-        next_color_idx = 0
-
-        def colour_for(label: str) -> str:
-            nonlocal next_color_idx
-            if not label: return "#4C566A"
-            if label not in colour_map:
-                colour_map[label] = PREDEFINED_COLORS[next_color_idx % len(PREDEFINED_COLORS)]
-                next_color_idx += 1
-            return colour_map.get(label, "#4C566A")
-
-        for node_id, label, display_text, degree in nodes:
-            net.add_node(node_id, label=str(display_text)[:120], title=f"{display_text}\nLabel: {label}\nDegree: {degree}", color=colour_for(label), shape="dot", size=10 + int(degree) * 2)
-        valid_node_ids = {n[0] for n in nodes}  # Set of all known node IDs
-
-        for from_id, to_id, rel_type in edges:
-            if from_id in valid_node_ids and to_id in valid_node_ids:
-                net.add_edge(from_id, to_id, label=str(rel_type), arrows="to")
-        # for from_id, to_id, rel_type in edges:
-        #     net.add_edge(from_id, to_id, label=str(rel_type), arrows="to")
-
         net.show_buttons(filter_=['nodes', 'edges', 'physics'])
         net.set_options("""
         var options = {
@@ -131,4 +112,4 @@ def visualize(
 
     except Exception as e:
         typer.secho(f"🔥  A critical error occurred: {e}", fg=typer.colors.RED)
-        traceback.print_exception(e)
+        utils.print_traceback(e)
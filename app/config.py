@@ -6,16 +6,52 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Set APP_DEBUG=1 to print full tracebacks when a command fails.
+DEBUG = os.getenv("APP_DEBUG") == "1"
+
 # Directory and File Paths
 INITIAL_PDF_DIR = "data/initial_pdfs"
 ADDITIONAL_PDF_DIR = "data/additional_pdfs"
 ONTOLOGY_FILE = "ontology.json"
 ONTO_PATH = Path(ONTOLOGY_FILE)
 
+# PDF Parsing Configuration
+# "fast" reads the embedded text layer; use "hi_res" or "ocr_only" for scanned PDFs.
+PARTITION_STRATEGY = os.getenv("PARTITION_STRATEGY", "fast")
+# When "fast" finds almost no text layer (fewer characters per page than the minimum,
+# as in a scan), the PDF is partitioned again with this strategy. Set it empty to disable.
+PARTITION_FALLBACK_STRATEGY = os.getenv("PARTITION_FALLBACK_STRATEGY", "hi_res")
+PARTITION_MIN_CHARS_PER_PAGE = 50
+# Extracted text is cached here keyed by PDF content; delete the folder to invalidate.
+PARTITION_CACHE_DIR = Path(".cache/partitioned")
+# Discovered ontologies, keyed by the initial PDFs' text and the model; delete the folder to invalidate.
+ONTOLOGY_DISCOVERY_CACHE_DIR = Path(".cache/ontologies")
+# Records which PDFs (by text digest) have been written to the graph, so `build` skips them next time.
+INGEST_MANIFEST = Path(".cache/ingested.json")
+# Canonical spelling of every entity name seen by `build`, kept and cleared together with the manifest.
+CANONICAL_NAMES_FILE = Path(".cache/canonical_names.json")
+
 # Graph and Database Configuration
 GRAPH_NAME = "assignment_kg"
 FALKORDB_HOST = os.getenv("FALKORDB_HOST", "localhost")
 FALKORDB_PORT = int(os.getenv("FALKORDB_PORT", 6379))
+REDIS_MAX_CONNECTIONS = 32
 
 # LLM Configuration
-DEFAULT_MODEL_NAME = "openai/gpt-4o"
\ No newline at end of file
+DEFAULT_MODEL_NAME = "openai/gpt-4o"
+ASK_MAX_WORKERS = 8
+# Sampling settings for `ask`; pinned so repeated questions get repeatable answers.
+ASK_TEMPERATURE = 0
+ASK_SEED = int(os.getenv("ASK_SEED", 7))
+# Extraction runs one document per worker thread; the token limits match the SDK defaults.
+EXTRACT_MAX_WORKERS = int(os.getenv("EXTRACT_MAX_WORKERS", 16))
+EXTRACT_MAX_INPUT_TOKENS = 500000
+EXTRACT_MAX_OUTPUT_TOKENS = 8192
+# Documents handed to the extraction step per call; the manifest is saved after each chunk.
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 64))
+# Retries for LLM-backed SDK calls, with exponential backoff starting at the base delay (seconds).
+LLM_RETRIES = 3
+LLM_RETRY_BASE_DELAY = 1.0
+# Answer Cache Configuration
+ASK_CACHE_PREFIX = "qc:"
+ASK_CACHE_TTL = int(os.getenv("ASK_CACHE_TTL", 86400))
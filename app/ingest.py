@@ -0,0 +1,205 @@
+# app/ingest.py
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Optional
+
+from graphrag_sdk import KnowledgeGraph, Ontology
+from graphrag_sdk.steps.extract_data_step import ExtractDataStep
+from redis.exceptions import ResponseError
+
+from app import config, utils
+from app.redis_client import ident
+
+def _props(field: str, names) -> str:
+    """Renders a Cypher property pattern that reads each key from the `field` map of the row."""
+    return ", ".join(f"{ident(name)}: {field}.{ident(name)}" for name in names)
+
+# The same few label/key shapes recur in every document of a run, so each
+# statement is rendered once and reused.
+@lru_cache(maxsize=1024)
+def _entity_query(label: str, keys: tuple) -> str:
+    return f"UNWIND $rows AS row MERGE (n:{ident(label)} {{{_props('row.key', keys)}}}) SET n += row.props"
+
+@lru_cache(maxsize=1024)
+def _relation_query(src_label: str, src_keys: tuple, dst_label: str, dst_keys: tuple, rel_label: str) -> str:
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (s:{ident(src_label)} {{{_props('row.src', src_keys)}}}) "
+        f"MATCH (d:{ident(dst_label)} {{{_props('row.dst', dst_keys)}}}) "
+        f"MERGE (s)-[r:{ident(rel_label)}]->(d) SET r += row.props"
+    )
+
+def ensure_indexes(graph, ontology: Ontology) -> int:
+    """
+    Indexes the unique attributes of every entity label, so the MERGE and MATCH
+    lookups in the batched writes are index seeks rather than label scans.
+    Indexes that already exist are left alone. Returns the number created.
+    """
+    created = 0
+    for entity in ontology.entities:
+        keys = [attr.name for attr in entity.attributes if attr.unique]
+        if not keys:
+            continue
+        fields = ", ".join(f"n.{ident(key)}" for key in keys)
+        try:
+            graph.query(f"CREATE INDEX FOR (n:{ident(entity.label)}) ON ({fields})")
+            created += 1
+        except ResponseError as e:
+            if "already indexed" not in str(e):
+                raise
+    return created
+
+# Only these keys hold names, where spelling variants of one thing are common;
+# other unique keys (ids, DOIs, dates) are written exactly as extracted.
+_CANONICAL_KEYS = frozenset({"name", "title"})
+
+def _fold(value: str) -> str:
+    """Case- and whitespace-insensitive form of a key value."""
+    return " ".join(value.split()).casefold()
+
+class _WriteBuffer:
+    """
+    Collects the entities and relations extracted from one document, grouped by
+    the shape of the Cypher statement they need, so each group can be written
+    with a single UNWIND query instead of one MERGE per row.
+
+    Name and title key values are canonicalised through `canonical`, which maps each
+    folded value to the first spelling seen, so "OpenAI", " openai " and "OPENAI"
+    become one row and one node. Pass the same mapping to every buffer of a run to share it.
+    """
+    def __init__(self, graph, canonical: Optional[Dict] = None):
+        self.graph = graph
+        self.canonical = canonical if canonical is not None else {}
+        self.entities = defaultdict(dict)
+        self.relations = defaultdict(dict)
+
+    def _canonicalise(self, key: dict) -> dict:
+        # dict.setdefault is atomic, so buffers on different threads can share the mapping.
+        return {
+            name: self.canonical.setdefault(_fold(value), value) if name in _CANONICAL_KEYS and isinstance(value, str) else value
+            for name, value in key.items()
+        }
+
+    def add_entity(self, label: str, key: dict, props: dict) -> None:
+        """Buffers an entity; repeats of the same key are folded into one row."""
+        key = self._canonicalise(key)
+        rows = self.entities[(label, tuple(key))]
+        row = rows.setdefault(tuple(key.values()), {"key": key, "props": {}})
+        row["props"].update(props)
+
+    def add_relation(self, src_label: str, src: dict, dst_label: str, dst: dict, label: str, props: dict) -> None:
+        """Buffers a relation; repeats between the same endpoints are folded into one row."""
+        src, dst = self._canonicalise(src), self._canonicalise(dst)
+        rows = self.relations[(src_label, tuple(sorted(src)), dst_label, tuple(sorted(dst)), label)]
+        row_id = (tuple(sorted(src.items())), tuple(sorted(dst.items())))
+        row = rows.setdefault(row_id, {"src": src, "dst": dst, "props": {}})
+        row["props"].update(props)
+
+    def _write_group(self, query: str, rows: list, kind: str) -> int:
+        """
+        Writes one group with a single query. A bad row fails the whole UNWIND, so on
+        an error the group is retried row by row and only the failing rows are dropped.
+        Returns the query count.
+        """
+        try:
+            self.graph.query(query, {"rows": rows})
+            return 1
+        except ResponseError:
+            pass
+        for row in rows:
+            try:
+                self.graph.query(query, {"rows": [row]})
+            except ResponseError as e:
+                print(f"Error creating {kind} {row}: {e}")
+        return 1 + len(rows)
+
+    def flush(self) -> int:
+        """Writes all buffered rows. Entities go first so relations can MATCH them. Returns the query count."""
+        queries = 0
+        for group, rows in self.entities.items():
+            queries += self._write_group(_entity_query(*group), list(rows.values()), "entity")
+
+        for group, rows in self.relations.items():
+            queries += self._write_group(_relation_query(*group), list(rows.values()), "relation")
+
+        self.entities.clear()
+        self.relations.clear()
+        return queries
+
+class BatchedExtractDataStep(ExtractDataStep):
+    """
+    The SDK's extraction step, but writing each document's results in batches.
+    Extraction itself is unchanged; only the per-row MERGE round-trips are replaced.
+    Every document's buffer canonicalises names through the `canonical` mapping.
+    """
+    def __init__(self, *args, canonical: Optional[Dict[str, str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._canonical_names = canonical if canonical is not None else {}
+
+    def _process_document(self, task_id, chat_session, document, ontology, graph, *args, **kwargs):
+        buffer = _WriteBuffer(graph, self._canonical_names)
+        super()._process_document(task_id, chat_session, document, ontology, buffer, *args, **kwargs)
+        buffer.flush()
+
+    def _create_entity(self, graph: _WriteBuffer, args: dict, ontology: Ontology) -> None:
+        entity = ontology.get_entity_with_label(args["label"])
+        if entity is None:
+            print(f"Entity with label {args['label']} not found in ontology")
+            return None
+        attributes = args.get("attributes") or {}
+        key = {attr.name: attributes.get(attr.name, "") for attr in entity.attributes if attr.unique}
+        props = {
+            attr.name: attributes[attr.name]
+            for attr in entity.attributes
+            if not attr.unique and attr.name in attributes
+        }
+        graph.add_entity(args["label"], key, props)
+
+    def _create_relation(self, graph: _WriteBuffer, args: dict, ontology: Ontology) -> None:
+        if len(ontology.get_relations_with_label(args["label"])) == 0:
+            print(f"Relations with label {args['label']} not found in ontology")
+            return None
+        src = args["source"].get("attributes") or {}
+        dst = args["target"].get("attributes") or {}
+        props = args.get("attributes")
+        graph.add_relation(
+            args["source"]["label"], src, args["target"]["label"], dst, args["label"],
+            props if isinstance(props, dict) else {},
+        )
+
+class BatchedKnowledgeGraph(KnowledgeGraph):
+    """A KnowledgeGraph whose `process_sources` writes through `BatchedExtractDataStep`."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A new extraction step is built for every process_sources call, so the
+        # name mapping lives here to be shared across all chunks and passes of a build.
+        # It is loaded from disk because the manifest skips documents ingested by
+        # earlier builds, and their spellings must still win over later variants.
+        try:
+            self.canonical_names: Dict[str, str] = utils.read_json(config.CANONICAL_NAMES_FILE)
+        except (OSError, ValueError):
+            self.canonical_names = {}
+
+    def save_canonical_names(self) -> None:
+        """Writes the name mapping to `config.CANONICAL_NAMES_FILE` for the next build."""
+        config.CANONICAL_NAMES_FILE.parent.mkdir(parents=True, exist_ok=True)
+        utils.write_json(config.CANONICAL_NAMES_FILE, self.canonical_names)
+
+    def _create_graph_with_sources(
+        self, sources: Optional[list] = None, instructions: Optional[str] = None, hide_progress: Optional[bool] = False
+    ) -> None:
+        step = BatchedExtractDataStep(
+            sources=list(sources),
+            ontology=self.ontology,
+            model=self._model_config.extract_data,
+            graph=self.graph,
+            config={
+                "max_workers": config.EXTRACT_MAX_WORKERS,
+                "max_input_tokens": config.EXTRACT_MAX_INPUT_TOKENS,
+                "max_output_tokens": config.EXTRACT_MAX_OUTPUT_TOKENS,
+            },
+            hide_progress=hide_progress,
+            canonical=self.canonical_names,
+        )
+        ensure_indexes(self.graph, self.ontology)
+        self.failed_documents = step.run(instructions)
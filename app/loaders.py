@@ -1,44 +1,227 @@
-
 # app/loaders.py
+import asyncio
+import hashlib
+import io
 import os
+import re
 import typer
-from typing import Iterator, List
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from importlib import metadata
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 
 # We only need Document from the SDK here
 from graphrag_sdk.document import Document
 
+from app import config
+
+def _import_partition():
+    """Imports unstructured's auto-partitioner, with a helpful error if it is missing."""
+    try:
+        from unstructured.partition.auto import partition
+    except ImportError:
+        raise ImportError(
+            "unstructured[pdf] package not found. Please install it with `pip install 'unstructured[pdf]'`"
+        )
+    return partition
+
+@lru_cache(maxsize=1)
+def _unstructured_version() -> str:
+    try:
+        return metadata.version("unstructured")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+# Bump whenever `_elements_text` changes its output, so text cached by an older
+# version is extracted again rather than reused.
+_TEXT_FORMAT_VERSION = 2
+
+def _partition_cache_key(data: bytes) -> str:
+    """Hashes the PDF bytes together with everything else that affects the extracted text."""
+    h = hashlib.sha256(data)
+    h.update(
+        f"|{config.PARTITION_STRATEGY}|{config.PARTITION_FALLBACK_STRATEGY}|{_unstructured_version()}|{_TEXT_FORMAT_VERSION}".encode("utf-8")
+    )
+    return h.hexdigest()
+
+def _stat_cache_key(path: str, st: os.stat_result) -> str:
+    """Hashes the file's identity and stat, so an unchanged PDF can be matched without reading it."""
+    ident = (
+        f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        f"|{config.PARTITION_STRATEGY}|{config.PARTITION_FALLBACK_STRATEGY}|{_unstructured_version()}|{_TEXT_FORMAT_VERSION}"
+    )
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+# Page furniture that unstructured labels as such; it repeats on every page and
+# carries nothing worth extracting, so dropping it saves LLM input tokens.
+_SKIPPED_CATEGORIES = frozenset({"Header", "Footer", "PageNumber"})
+_WHITESPACE = re.compile(r"\s+")
+# Tables keep their internal whitespace, which is what lines up their rows and columns.
+_VERBATIM_CATEGORIES = frozenset({"Table"})
+
+def _elements_text(elements) -> str:
+    """
+    Joins partitioned elements into one text, separated by blank lines.
+    Whitespace inside each element other than a table is collapsed, and headers,
+    footers and page numbers are left out.
+    """
+    # Write each element straight into one buffer rather than building a list of
+    # strings and joining it, which briefly holds two copies of the text.
+    buf = io.StringIO()
+    sep = ""
+    for el in elements:
+        category = getattr(el, "category", None)
+        if category in _SKIPPED_CATEGORIES:
+            continue
+        text = str(el) if category in _VERBATIM_CATEGORIES else _WHITESPACE.sub(" ", str(el))
+        text = text.strip()
+        if text:
+            buf.write(sep)
+            buf.write(text)
+            sep = "\n\n"
+    return buf.getvalue()
+
+def _is_sparse(text: str, elements) -> bool:
+    """True if `text` has fewer characters per page than a real text layer would, e.g. for a scan."""
+    pages = [getattr(getattr(el, "metadata", None), "page_number", None) for el in elements]
+    num_pages = max((p for p in pages if isinstance(p, int)), default=1)
+    # _elements_text already strips every element, so the length needs no second strip.
+    return len(text) < config.PARTITION_MIN_CHARS_PER_PAGE * num_pages
+
+def _write_atomic(path, text: str) -> None:
+    # Write to a temporary name first so concurrent workers never read a partial file.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+def list_pdfs(directory: str) -> List[str]:
+    """
+    Returns the paths of the PDF files directly inside `directory`.
+    `os.scandir` yields entries that already carry their full path and file type,
+    so no per-file path join or extra stat call is needed. Hidden files (such as
+    macOS `._*.pdf` resource forks) are skipped, since they are not real PDFs.
+    """
+    with os.scandir(directory) as it:
+        return [
+            entry.path for entry in it
+            if entry.name.lower().endswith(".pdf") and not entry.name.startswith(".") and entry.is_file()
+        ]
+
+def partition_text(path: str, partition=None) -> str:
+    """
+    Partitions a PDF with unstructured.io and returns its text. With the "fast"
+    strategy, a PDF with almost no text layer is partitioned again with the fallback.
+    Results are cached on disk by content hash, so unchanged PDFs are only parsed once.
+    A second index keyed by path, size and mtime points at that cache, so a PDF
+    that has not been touched since the last run is not even read.
+    Module-level so it can be shipped to worker processes.
+    Args:
+        path (str): The path to the PDF file.
+        partition: The partition function to use. Imported on demand if omitted.
+    """
+    stat_path = config.PARTITION_CACHE_DIR / "by-stat" / _stat_cache_key(path, os.stat(path))
+    try:
+        return (config.PARTITION_CACHE_DIR / f"{stat_path.read_text()}.txt").read_text(encoding="utf-8")
+    except OSError:
+        pass
+
+    # Read the file once and hand unstructured an in-memory stream, so it does not
+    # re-open and seek through the file on disk while detecting and parsing it.
+    with open(path, "rb") as fh:
+        data = fh.read()
+
+    content_key = _partition_cache_key(data)
+    cache_path = config.PARTITION_CACHE_DIR / f"{content_key}.txt"
+    if cache_path.exists():
+        _write_atomic(stat_path, content_key)
+        return cache_path.read_text(encoding="utf-8")
+
+    partition = partition or _import_partition()
+    elements = partition(file=io.BytesIO(data), metadata_filename=path, strategy=config.PARTITION_STRATEGY)
+    text = _elements_text(elements)
+
+    # "fast" only reads the embedded text layer, which is ~100x quicker than OCR;
+    # the slower strategy is reserved for PDFs where that layer is missing.
+    fallback = config.PARTITION_FALLBACK_STRATEGY
+    if config.PARTITION_STRATEGY == "fast" and fallback and _is_sparse(text, elements):
+        try:
+            text = _elements_text(partition(file=io.BytesIO(data), metadata_filename=path, strategy=fallback))
+        except Exception as e:
+            typer.secho(f"  ⚠️  '{fallback}' partitioning failed for {os.path.basename(path)}, keeping the fast result: {e}", fg=typer.colors.YELLOW)
+            # Not cached: the failure is usually environmental (a missing model or
+            # poppler), and the next build should try the fallback again.
+            return text
+
+    # Blank text is not cached either, so the PDF is partitioned again next time.
+    if not text:
+        return text
+    _write_atomic(cache_path, text)
+    _write_atomic(stat_path, content_key)
+    return text
+
+async def iter_pdf_texts(paths: List[str], max_workers: Optional[int] = None) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Partitions many PDFs in parallel worker processes, yielding each one as soon as it is done.
+    Each file is independent and partitioning is CPU-bound, so this scales with cores,
+    and callers can start working on early files while later ones are still parsing.
+    PDFs that fail to parse, or that contain no text (e.g. scans without OCR),
+    are reported and skipped, so no LLM work is spent on them later.
+
+    Yields:
+        Tuple[str, str]: The PDF path and its extracted text, in completion order.
+    """
+    if not paths:
+        return
+    workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        async def _parse(path: str):
+            try:
+                return path, await loop.run_in_executor(executor, partition_text, path), None
+            except Exception as e:
+                return path, None, e
+
+        for next_done in asyncio.as_completed([_parse(path) for path in paths]):
+            path, text, error = await next_done
+            if error is not None:
+                typer.secho(f"  ⚠️  Skipping {os.path.basename(path)}: {error}", fg=typer.colors.YELLOW)
+                continue
+            # isspace() answers the same question as strip() without copying the text.
+            if not text or text.isspace():
+                typer.secho(f"  ⚠️  Skipping {os.path.basename(path)}: no extractable text", fg=typer.colors.YELLOW)
+                continue
+            typer.secho(f"  -> Parsed with Unstructured.io: {os.path.basename(path)}", fg=typer.colors.CYAN)
+            yield path, text
+
 # This class does NOT inherit from graphrag_sdk.Source to avoid metaclass conflicts.
 # It uses duck typing to behave like a Source object.
 class UnstructuredPDFLoader:
     """A custom loader that uses unstructured.io to process a PDF."""
-    def __init__(self, path: str):
+    def __init__(self, path: str, text: Optional[str] = None):
         """
         Initializes the loader with the path to the PDF.
         Args:
             path (str): The path to the PDF file.
+            text (Optional[str]): Text already extracted from the PDF (see `iter_pdf_texts`).
+                When given, `load` returns it instead of partitioning the file again.
         """
         # Mimic the attributes of the SDK's Source class.
         self.source_id = path
         self.instruction = None
-
-        try:
-            from unstructured.partition.auto import partition
-        except ImportError:
-            raise ImportError(
-                "unstructured[pdf] package not found. Please install it with `pip install 'unstructured[pdf]'`"
-            )
-        self._partition = partition
+        self._text = text
+        self._partition = _import_partition() if text is None else None
 
     def load(self) -> Iterator[Document]:
         """
         Loads and partitions the PDF using unstructured's auto-partitioner,
         yielding a single Document.
-        
+
         Returns:
             Iterator[Document]: An iterator containing one Document object with the full text.
         """
+        if self._text is not None:
+            yield Document(self._text, id=self.source_id)
+            return
         typer.secho(f"  -> Loading PDF with Unstructured.io: {os.path.basename(self.source_id)}", fg=typer.colors.CYAN)
-        elements = self._partition(filename=self.source_id)
-        full_text = "\n\n".join([str(el) for el in elements])
-        yield Document(full_text, id=self.source_id)
-
+        yield Document(partition_text(self.source_id, self._partition), id=self.source_id)
@@ -0,0 +1,113 @@
+# app/redis_client.py
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app import config
+
+@asynccontextmanager
+async def connect() -> AsyncIterator:
+    """
+    Opens an async Redis client for the FalkorDB instance, and closes it together
+    with its connection pool on exit, even if a query raised. Each command makes a
+    single `asyncio.run` per process, so there is no pool worth keeping between calls.
+    """
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise ImportError("redis package not found. Please install it with `pip install redis`")
+
+    # The client owns the pool it creates, so aclose() disconnects every pooled connection.
+    r = redis.Redis(
+        host=config.FALKORDB_HOST,
+        port=config.FALKORDB_PORT,
+        max_connections=config.REDIS_MAX_CONNECTIONS,
+        decode_responses=True,
+    )
+    try:
+        yield r
+    finally:
+        await r.aclose()
+
+def ident(name: str) -> str:
+    """Backtick-quotes a label or property name. FalkorDB cannot escape backticks, so they are dropped."""
+    return f"`{name.replace('`', '')}`"
+
+def with_params(query: str, params: Optional[dict] = None) -> str:
+    """Prefixes `query` with a `CYPHER name=value ...` header so it can refer to `$name` parameters."""
+    if not params:
+        return query
+    from falkordb.helpers import stringify_param_value
+    header = " ".join(f"{name}={stringify_param_value(value)}" for name, value in params.items())
+    return f"CYPHER {header} {query}"
+
+# The CLI only ever reads through this module, so queries go out as GRAPH.RO_QUERY:
+# the server can run them alongside a concurrent `build` without taking the write path.
+_READ_COMMAND = "GRAPH.RO_QUERY"
+
+async def graph_query(r, query: str, params: Optional[dict] = None) -> list:
+    """Runs a read-only Cypher query against the configured graph and returns the compact reply."""
+    return await r.execute_command(_READ_COMMAND, config.GRAPH_NAME, with_params(query, params), "--compact")
+
+async def graph_query_many(r, queries: list[str]) -> list:
+    """
+    Runs several read-only Cypher queries in a single pipeline, so they share one
+    network round-trip. Replies are returned in the order of `queries`.
+    """
+    async with r.pipeline(transaction=False) as pipe:
+        for query in queries:
+            pipe.execute_command(_READ_COMMAND, config.GRAPH_NAME, query, "--compact")
+        return await pipe.execute()
+
+def compact_rows(raw_response: list) -> list:
+    """
+    Parses the complex, nested list structure from a --compact FalkorDB query.
+    The expected format is [ header, [data_rows], metadata ], where every cell
+    is a [type, value] pair. Returns the rows as flat lists of values.
+    """
+    if not raw_response or len(raw_response) < 2:
+        return []
+
+    width = len(raw_response[0])
+    data_section = raw_response[1]
+
+    if type(data_section) is not list:
+        return []
+
+    # Replies are plain lists, so exact type checks are enough and skip isinstance's MRO walk.
+    return [
+        [cell[1] if type(cell) is list else cell for cell in row]
+        for row in data_section
+        if type(row) is list and len(row) == width
+    ]
+
+async def count_by_label(r, node_labels: List[str] = (), edge_labels: List[str] = ()) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Counts the nodes of each node label and the edges of each relation label.
+    Each kind is counted by one UNION ALL query, and both go out in one pipeline,
+    so the whole lookup is a single round-trip and at most two query executions.
+    Falls back to one pipelined query per label if the server rejects the UNION.
+    """
+    from falkordb.helpers import stringify_param_value
+    from redis.exceptions import ResponseError
+
+    def _parts(kind: str, labels, pattern: str) -> List[str]:
+        return [
+            f"MATCH {pattern.format(ident(lbl))} RETURN '{kind}' AS kind, {stringify_param_value(lbl)} AS label, count(*) AS c"
+            for lbl in labels
+        ]
+
+    node_parts = _parts("node", node_labels, "(:{})")
+    edge_parts = _parts("edge", edge_labels, "()-[:{}]->()")
+
+    async def _run(queries: List[str]) -> Dict[tuple, int]:
+        replies = await graph_query_many(r, queries)
+        return {(kind, lbl): int(c) for reply in replies for kind, lbl, c in compact_rows(reply)}
+
+    try:
+        counts = await _run([" UNION ALL ".join(parts) for parts in (node_parts, edge_parts) if parts])
+    except ResponseError:
+        counts = await _run(node_parts + edge_parts)
+
+    node_ct = {lbl: counts.get(("node", lbl), 0) for lbl in node_labels}
+    edge_ct = {lbl: counts.get(("edge", lbl), 0) for lbl in edge_labels}
+    return node_ct, edge_ct
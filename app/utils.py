@@ -1,45 +1,126 @@
 # app/utils.py
+import asyncio
+import json
+import os
 import typer
-from typing import List, Tuple
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 from graphrag_sdk import Ontology
 
+from app import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def read_json(path) -> Any:
+    """Reads a JSON file, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, "rb") as fh:
+            return orjson.loads(fh.read())
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+def write_json(path: Path, data: Any) -> None:
+    """Writes `data` to `path` as indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        path.write_text(json.dumps(data, indent=2))
+
+_ATTR_DEFAULTS = {"type": "string", "unique": False, "required": False}
+
 def normalise_schema(raw: dict) -> dict:
     """
     Ensure every attribute dict has 'type', 'unique', 'required' keys.
     Adds sensible defaults if they are missing.
     """
     for ent in raw.get("entities", []):
-        for attr in ent.get("attributes", []):
-            attr.setdefault("type", "string")
-            attr.setdefault("unique", False)
-            attr.setdefault("required", False)
+        # One merge per attribute; keys already present override the defaults.
+        ent["attributes"] = [{**_ATTR_DEFAULTS, **attr} for attr in ent.get("attributes", [])]
     return raw
 
-def merge_ontologies(a: Ontology, b: Ontology) -> Ontology:
+class OntologyAccumulator:
+    """
+    Incrementally unions ontologies by label. On a label clash the earliest one wins.
+    The label indexes are kept between `add` calls, so folding in N ontologies
+    is linear rather than rebuilding the index for every pair.
+    """
+    def __init__(self):
+        self._ent_by_label = {}
+        self._rel_by_label = {}
+
+    def add(self, ontology: Ontology) -> "OntologyAccumulator":
+        for ent in ontology.entities:
+            self._ent_by_label.setdefault(ent.label, ent)
+        for rel in ontology.relations:
+            self._rel_by_label.setdefault(rel.label, rel)
+        return self
+
+    def build(self) -> Ontology:
+        return Ontology(list(self._ent_by_label.values()), list(self._rel_by_label.values()))
+
+def merge_ontologies(*ontologies: Ontology) -> Ontology:
     """
     Return a new Ontology containing the union of entities / relations
-    from A and B.
+    from all the given ontologies. On a label clash the earliest one wins.
     """
-    def _by_label(seq):
-        return {item.label: item for item in seq}
+    acc = OntologyAccumulator()
+    for onto in ontologies:
+        acc.add(onto)
+    return acc.build()
 
-    ent_map = _by_label(a.entities)
-    for ent in b.entities:
-        ent_map.setdefault(ent.label, ent)
+# Parsed ontologies for this process, keyed by the file's (path, mtime, size).
+_ontology_memo: Dict[tuple, Ontology] = {}
 
-    rel_map = _by_label(a.relations)
-    for rel in b.relations:
-        rel_map.setdefault(rel.label, rel)
+def _file_stamp(path: str) -> tuple:
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
 
-    return Ontology(list(ent_map.values()), list(rel_map.values()))
+def load_ontology(path: Optional[str] = None) -> Ontology:
+    """
+    Loads the ontology file (default: `config.ONTOLOGY_FILE`), reusing an earlier parse while it is unchanged.
+    The same object is returned until the file changes, which is what lets
+    `ask` reuse its graph client across calls.
+    """
+    path = path or config.ONTOLOGY_FILE
+    stamp = _file_stamp(path)
+    if stamp not in _ontology_memo:
+        _ontology_memo.clear()
+        _ontology_memo[stamp] = Ontology.from_json(read_json(path))
+    return _ontology_memo[stamp]
 
-def print_table(rows: List[Tuple[str, str]], title: str = "") -> None:
-    """Prints a formatted table to the console."""
+T = TypeVar("T")
+
+async def to_thread_with_retry(fn: Callable[..., T], *args, attempts: int = 3, base_delay: float = 1.0, **kwargs) -> T:
+    """
+    Runs a blocking call in a worker thread, retrying failures with exponential backoff.
+    Meant for SDK calls that hit the LLM, where a 429 or timeout is usually transient.
+    """
+    for attempt in range(attempts):
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(base_delay * 2 ** attempt)
+
+def print_table(rows: List[Tuple[str, Any]], title: str = "") -> None:
+    """Prints a formatted table to the console. Values in the second column are formatted as-is."""
     if title:
         typer.secho(f"\n{title}", fg=typer.colors.BRIGHT_BLUE, bold=True)
     if not rows:
         return
     # Find the maximum width for the first column
     w = max(len(r[0]) for r in rows) if rows else 0
-    for l, r in rows:
-        typer.echo(f"  {l.ljust(w)}  {r}")
\ No newline at end of file
+    # One write for the whole table rather than one per row.
+    typer.echo("\n".join([f"  {l.ljust(w)}  {r}" for l, r in rows]))
+
+def print_traceback(exc: BaseException) -> None:
+    """Prints the traceback of `exc` when APP_DEBUG=1; otherwise says how to get it."""
+    if not config.DEBUG:
+        typer.secho("   Set APP_DEBUG=1 to see the full traceback.", dim=True)
+        return
+    import traceback
+    traceback.print_exception(exc)
\ No newline at end of file